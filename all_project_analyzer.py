@@ -5,63 +5,192 @@
 import ast
 import os
 import builtins
+import hashlib
 import json
+import sys
+from array import array
 from collections import defaultdict
-from typing import List, Dict, Any, Set, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import List, Dict, Any, Set, Tuple, Optional, Callable, Iterator
 
+try:
+    import orjson
+except ImportError:  # orjsonが無い環境では標準のjsonで出力する
+    orjson = None
 
-class SymbolVisitor(ast.NodeVisitor):
-    """ASTを走査してシンボルの定義、使用、インポート情報を収集するビジター。"""
+# 解析対象から除外するディレクトリ名
+EXCLUDED_DIRS = frozenset({'.venv', '.git', '__pycache__', 'node_modules', '.mypy_cache', '.pytest_cache'})
+# どのファイルでも定義済みとみなす組み込みシンボルとマジック変数
+BUILTIN_SYMBOLS = frozenset(dir(builtins)) | {'__file__', '__name__'}
+# これより少ないファイル数ではプロセスプールを使わずに解析する
+_PARALLEL_MIN_FILES = 32
+# 解析結果のキャッシュ（プロジェクトルートに作成される）
+CACHE_FILE_NAME = ".project_analyzer_cache.json"
+# キャッシュに保存するレコードの形式を変えたら更新する
+_CACHE_VERSION = 4
 
-    def __init__(self, file_path: str, project_root: str):
+
+class _ScopeBegin:
+    """走査スタックに積む、スコープの始まりを表す目印。囲むスコープで評価される子ノードの後に取り出される。"""
+    __slots__ = ('names', 'end')
+
+    def __init__(self, names: Set[str], end: '_ScopeEnd'):
+        self.names = names
+        self.end = end
+
+
+class _ScopeEnd:
+    """走査スタックに積む、スコープの終わりを表す目印。"""
+
+
+class _ClassEnd(_ScopeEnd):
+    """走査スタックに積む、クラス定義の終わりを表す目印。"""
+
+
+_SCOPE_END = _ScopeEnd()
+_CLASS_END = _ClassEnd()
+
+# 子ノードにシンボルが現れることのない葉ノードの型。走査スタックには積まない。
+_LEAF_TYPES = frozenset(
+    [ast.Constant]
+    + [t for base in (ast.expr_context, ast.boolop, ast.operator, ast.unaryop, ast.cmpop)
+       for t in base.__subclasses__()]
+)
+
+
+class SymbolVisitor:
+    """ASTを走査してシンボルの定義、使用、インポート情報を収集するビジター。
+
+    再帰呼び出しを使わず、明示的なスタックで先行順に走査する。各ハンドラは
+    自分の子ノードを必要な順序でスタックに積み、スコープの終わりには目印を積む。
+    """
+
+    def __init__(self, file_path: str, rel_path: str, module_index: Dict[str, str]):
         self.file_path = file_path
-        self.project_root = project_root
+        self.rel_path = rel_path
+        self.module_index = module_index
+        # 相対インポートの基準となる、このファイルが属するパッケージ (例: ['pkg', 'sub'])
+        self._package_parts: List[str] = rel_path.split(os.sep)[:-1]
         self.definitions: List[Dict[str, Any]] = []
-        self.used_symbols: List[Tuple[str, int]] = []
+        # 参照されたシンボルは名前と行番号を並列の配列に持つ（タプルを作らない）
+        self.used_names: List[str] = []
+        self.used_lines = array('i')
         self.imports: Set[str] = set()
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
         # __file__ などのマジック変数を最初からスコープに追加
         self._scope_stack: List[Set[str]] = [set(['__file__', '__name__'])]
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
+        # 各名前を現在定義しているスコープの数（どのスコープにも無い名前は含まない）
+        self._defined_counts: Dict[str, int] = dict.fromkeys(self._scope_stack[0], 1)
         self._current_class_name: Optional[str] = None
+        self._stack: List[Any] = []
+        # ノード型からハンドラを直接引けるテーブル。ハンドラの無いノードは子ノードを積むだけ。
+        self._dispatch: Dict[type, Callable[[Any], None]] = {
+            _ScopeBegin: self._begin_pending_scope,
+            _ScopeEnd: self._end_scope,
+            _ClassEnd: self._end_class,
+            ast.FunctionDef: self.visit_FunctionDef,
+            ast.AsyncFunctionDef: self.visit_AsyncFunctionDef,
+            ast.Lambda: self.visit_Lambda,
+            ast.ListComp: self._handle_comprehension,
+            ast.SetComp: self._handle_comprehension,
+            ast.DictComp: self._handle_comprehension,
+            ast.GeneratorExp: self._handle_comprehension,
+            ast.comprehension: self.visit_comprehension,
+            ast.ClassDef: self.visit_ClassDef,
+            ast.Assign: self.visit_Assign,
+            ast.Name: self.visit_Name,
+            ast.Import: self.visit_Import,
+            ast.ImportFrom: self.visit_ImportFrom,
+        }
+
+    def visit(self, tree: ast.AST):
+        """ASTを走査する。"""
+        dispatch = self._dispatch
+        stack = self._stack
+        stack.append(tree)
+        while stack:
+            node = stack.pop()
+            handler = dispatch.get(type(node))
+            if handler:
+                handler(node)
+            else:
+                self._push_children(node)
+
+    def _push_children(self, node: ast.AST):
+        # 先頭の子ノードが最初に取り出されるよう逆順に積む
+        children = [child for child in ast.iter_child_nodes(node) if type(child) not in _LEAF_TYPES]
+        children.reverse()
+        self._stack.extend(children)
+
+    def _begin_scope(self, names: Set[str], end: _ScopeEnd = _SCOPE_END):
+        # 目印は子ノードより先に積まれるので、子ノードを全て処理した後に取り出される
+        self._stack.append(end)
+        self._enter_scope(names)
+
+    def _defer_scope(self, names: Set[str], body: List[ast.AST], outer: List[Any], end: _ScopeEnd = _SCOPE_END):
+        """`outer` を囲むスコープで訪問した後、新しいスコープで `body` を訪問するよう積む。"""
+        stack = self._stack
+        stack.append(end)
+        stack.extend(reversed(body))
+        stack.append(_ScopeBegin(names, end))
+        stack.extend(child for child in reversed(outer) if child is not None)
+
+    def _begin_pending_scope(self, marker: _ScopeBegin):
+        self._enter_scope(marker.names)
+
+    def _enter_scope(self, names: Set[str]):
+        self._scope_stack.append(names)
+        counts = self._defined_counts
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+
+    def _pop_scope(self):
+        counts = self._defined_counts
+        for name in self._scope_stack.pop():
+            if counts[name] == 1:
+                del counts[name]
+            else:
+                counts[name] -= 1
+
+    def _end_scope(self, _marker: _ScopeEnd):
+        self._pop_scope()
+
+    def _end_class(self, _marker: _ClassEnd):
+        self._pop_scope()
+        self._current_class_name = None
 
     def _add_defined(self, name: str):
-        if self._scope_stack:
-            self._scope_stack[-1].add(name)
+        scope = self._scope_stack[-1]
+        if name not in scope:
+            scope.add(name)
+            self._defined_counts[name] = self._defined_counts.get(name, 0) + 1
 
     def _is_defined_in_scope(self, name: str) -> bool:
-        for scope in reversed(self._scope_stack):
-            if name in scope:
-                return True
-        return False
+        # 名前を定義しているスコープの数を保持しているので、ネストの深さに依らずO(1)で判定できる
+        return name in self._defined_counts
 
     def _resolve_import_path(self, module_name: str, level: int) -> Optional[str]:
-        """相対インポートをプロジェクトルートからの絶対パスに解決する"""
+        """インポートをプロジェクト内モジュールの、プロジェクトルートからの相対パスに解決する。
+
+        プロジェクト内のモジュールは事前に `module_index` に登録されているため、
+        ファイルシステムには問い合わせず辞書の参照だけで解決する。
+        """
         if level == 0:  # 絶対インポート
             # NOTE: 標準ライブラリや外部ライブラリのパス解決は複雑なため、
             #       ここではプロジェクト内のモジュールに絞る
-            base_path = os.path.join(self.project_root, *module_name.split('.'))
-            for ext in ['.py', '/__init__.py']:
-                path = base_path + ext
-                if os.path.exists(path):
-                    return os.path.normpath(path)
-            return None
+            return self.module_index.get(module_name)
 
         # 相対インポート
-        current_dir = os.path.dirname(self.file_path)
-        base_path = os.path.abspath(os.path.join(current_dir, *(['..'] * (level - 1))))
-        
+        up = level - 1
+        if up > len(self._package_parts):
+            # プロジェクトルートより上を指している
+            return None
+        base_parts = self._package_parts[:len(self._package_parts) - up]
         if module_name:
-             path_components = module_name.split('.')
-             final_path = os.path.join(base_path, *path_components)
-        else:
-             final_path = base_path
-
-        for ext in ['.py', '/__init__.py']:
-            path_with_ext = final_path + ext
-            if os.path.exists(path_with_ext) and path_with_ext.startswith(self.project_root):
-                return os.path.normpath(path_with_ext)
-        return None
+            base_parts = base_parts + module_name.split('.')
+        return self.module_index.get('.'.join(base_parts))
 
     def visit_FunctionDef(self, node: ast.FunctionDef):
         is_method = self._current_class_name is not None
@@ -74,44 +203,27 @@ class SymbolVisitor(ast.NodeVisitor):
             })
         self._add_defined(node.name)
         
-        # 新しいスコープを開始
-        self._scope_stack.append({arg.arg for arg in node.args.args})
-        self.generic_visit(node)
-        self._scope_stack.pop()
+        # デコレータ、引数のデフォルト値と注釈、戻り値の注釈は定義時に囲むスコープで評価される。
+        # 関数本体だけを新しいスコープで訪問する
+        outer = node.decorator_list + [node.args, node.returns] + getattr(node, 'type_params', [])
+        self._defer_scope({arg.arg for arg in node.args.args}, node.body, outer)
 
     def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
         self.visit_FunctionDef(node)
 
-    # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
     def visit_Lambda(self, node: ast.Lambda):
         """ラムダ関数のスコープを処理する"""
-        # 新しいスコープを開始
-        self._scope_stack.append({arg.arg for arg in node.args.args})
-        self.generic_visit(node)
-        self._scope_stack.pop()
+        # デフォルト値は囲むスコープで評価され、本体の式だけが新しいスコープに属する
+        self._defer_scope({arg.arg for arg in node.args.args}, [node.body], [node.args])
 
     def _handle_comprehension(self, node: Any):
         """リスト、セット、辞書内包表記のスコープを処理する共通ハンドラ。"""
         # 内包表記のジェネレータは独自のスコープを持つ
-        self._scope_stack.append(set())
-        # ジェネレータ式（... for x in ... if ...）を先に訪問して変数をスコープに追加
-        for generator in node.generators:
-            self.visit(generator)
-        # その後、要素の式を訪問
-        self.visit(node.elt if hasattr(node, 'elt') else node.value)
-        self._scope_stack.pop()
-
-    def visit_ListComp(self, node: ast.ListComp):
-        self._handle_comprehension(node)
-
-    def visit_SetComp(self, node: ast.SetComp):
-        self._handle_comprehension(node)
-
-    def visit_DictComp(self, node: ast.DictComp):
-        self._handle_comprehension(node)
-        
-    def visit_GeneratorExp(self, node: ast.GeneratorExp):
-        self._handle_comprehension(node)
+        self._begin_scope(set())
+        # ジェネレータ式（... for x in ... if ...）を先に訪問して変数をスコープに追加し、
+        # その後に要素の式を訪問する（スタックなので逆順に積む）
+        self._stack.append(node.elt if hasattr(node, 'elt') else node.value)
+        self._stack.extend(reversed(node.generators))
 
     def visit_comprehension(self, node: ast.comprehension):
         # ターゲット変数（例: `x` in `for x in ...`）をスコープに追加
@@ -122,10 +234,8 @@ class SymbolVisitor(ast.NodeVisitor):
                 if isinstance(elt, ast.Name):
                     self._add_defined(elt.id)
         # イテラブルとif節を訪問
-        self.visit(node.iter)
-        for if_clause in node.ifs:
-            self.visit(if_clause)
-    # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
+        self._stack.extend(reversed(node.ifs))
+        self._stack.append(node.iter)
 
     def visit_ClassDef(self, node: ast.ClassDef):
         methods = []
@@ -142,35 +252,33 @@ class SymbolVisitor(ast.NodeVisitor):
         self._add_defined(node.name)
         
         # クラススコープの処理
+        # デコレータ、基底クラス、キーワード引数は囲むスコープで評価される
         self._current_class_name = node.name
-        self._scope_stack.append(set())
-        self.generic_visit(node)
-        self._scope_stack.pop()
-        self._current_class_name = None
+        outer = node.decorator_list + node.bases + node.keywords + getattr(node, 'type_params', [])
+        self._defer_scope(set(), node.body, outer, _CLASS_END)
 
     def visit_Assign(self, node: ast.Assign):
-        # 最初にvalueをvisitして、右辺で使われる変数をチェック
-        self.visit(node.value)
-        # その後、左辺のターゲットを定義済みとして追加
         for target in node.targets:
-            if isinstance(target, ast.Name):
-                # グローバルスコープでの変数定義を記録
-                if len(self._scope_stack) == 1:
-                    self.definitions.append({
-                        "type": "variable",
-                        "name": target.id,
-                        "line": node.lineno
-                    })
-                self._add_defined(target.id)
-            else:
-                # タプル展開代入なども処理
-                self.visit(target)
-
+            # グローバルスコープでの変数定義を記録
+            if type(target) is ast.Name and len(self._scope_stack) == 1:
+                self.definitions.append({
+                    "type": "variable",
+                    "name": target.id,
+                    "line": node.lineno
+                })
+        # 右辺で使われる変数を先にチェックし、その後に左辺のターゲットを定義済みとして追加する。
+        # タプル展開代入なども左辺のNameノード（Store）として処理される。
+        self._stack.extend(reversed(node.targets))
+        self._stack.append(node.value)
 
     def visit_Name(self, node: ast.Name):
-        if isinstance(node.ctx, ast.Load) and not self._is_defined_in_scope(node.id):
-            self.used_symbols.append((node.id, node.lineno))
-        elif isinstance(node.ctx, ast.Store):
+        # 最も頻繁に呼ばれるハンドラ。コンテキストの型は継承されないので同一性で比較する
+        ctx_type = type(node.ctx)
+        if ctx_type is ast.Load:
+            if not self._is_defined_in_scope(node.id):
+                self.used_names.append(node.id)
+                self.used_lines.append(node.lineno)
+        elif ctx_type is ast.Store:
             self._add_defined(node.id)
 
     def visit_Import(self, node: ast.Import):
@@ -189,75 +297,323 @@ class SymbolVisitor(ast.NodeVisitor):
             self._add_defined(alias.asname or alias.name)
 
 
+# ワーカープロセスごとに一度だけ受け取るモジュールインデックス
+_worker_module_index: Dict[str, str] = {}
+
+
+def _init_worker(module_index: Dict[str, str]):
+    global _worker_module_index
+    _worker_module_index = module_index
+
+
+def analyze_one(file_path: str, rel_path: str, module_index: Optional[Dict[str, str]] = None) -> Optional[Tuple[str, Dict[str, Any], str]]:
+    """単一のファイルを解析し、(プロジェクトルートからの相対パス `rel_path`, 解析結果, 内容のSHA-256) を返す。
+
+    ワーカープロセスから呼び出せるようモジュールレベルに置き、
+    戻り値はpickle可能な基本型のみで構成する。`module_index` を省略した場合は
+    `_init_worker` で渡されたインデックスを使う。
+    """
+    if module_index is None:
+        module_index = _worker_module_index
+    try:
+        # バイト列のまま渡すと、デコードとPEP 263のエンコーディング宣言の処理は
+        # パーサー内部で一度だけ行われる
+        with open(file_path, "rb") as f:
+            source = f.read()
+        # ファイルは閉じてから構文解析する
+        tree = ast.parse(source, filename=file_path)
+    except (OSError, SyntaxError, UnicodeDecodeError, ValueError, RecursionError, MemoryError) as e:
+        # 読み込みや構文解析で起こり得るエラーのみ捕捉し、解析処理自体のバグは隠さない
+        # (入れ子が深すぎるソースでは、パーサーが RecursionError や MemoryError を送出する)
+        print(f"Skipping file due to error: {file_path} - {e}")
+        return None
+
+    visitor = SymbolVisitor(file_path, rel_path, module_index)
+    visitor.visit(tree)
+
+    # モジュールインデックスは相対パスを保持しているので、インポート先をそのまま使える
+    return rel_path, {
+        "definitions": visitor.definitions,
+        "used_names": visitor.used_names,
+        "used_lines": visitor.used_lines,
+        "imports": visitor.imports,
+    }, hashlib.sha256(source).hexdigest()
+
+
+def _file_digest(file_path: str) -> Optional[str]:
+    """ファイル内容のSHA-256を返す。読み込めない場合はNone。"""
+    try:
+        with open(file_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _intern_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """解析結果に含まれるシンボル名を sys.intern で共有文字列にする。
+
+    パーサーが生成する識別子は既にインターンされているが、ワーカープロセスからの
+    unpickleやキャッシュのJSON読み込みで得た文字列は別オブジェクトになるため、
+    プロジェクト全体での集合演算の前に共有し直す。
+    """
+    intern = sys.intern
+    for definition in record["definitions"]:
+        definition["name"] = intern(definition["name"])
+    record["used_names"] = [intern(name) for name in record["used_names"]]
+    return record
+
+
+def _tarjan_scc(indptr: array, indices: array) -> array:
+    """CSR形式のグラフに対してTarjanのSCCアルゴリズムを実行し、各ノードの成分IDを返す。
+
+    整数配列だけを扱い、再帰の代わりに (ノード, 隣接ノードのイテレータ) の
+    明示的なスタックを使うため、O(V+E)で深いグラフでも RecursionError にならない。
+    """
+    n = len(indptr) - 1
+    index = array('i', [-1]) * n
+    lowlink = array('i', [0]) * n
+    on_stack = bytearray(n)
+    comp_id = array('i', [-1]) * n
+    component_stack: List[int] = []
+    counter = 0
+    n_components = 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        component_stack.append(root)
+        on_stack[root] = 1
+        work = [(root, iter(indices[indptr[root]:indptr[root + 1]]))]
+
+        while work:
+            node, neighbours = work[-1]
+            for neighbour in neighbours:
+                if index[neighbour] == -1:
+                    index[neighbour] = lowlink[neighbour] = counter
+                    counter += 1
+                    component_stack.append(neighbour)
+                    on_stack[neighbour] = 1
+                    work.append((neighbour, iter(indices[indptr[neighbour]:indptr[neighbour + 1]])))
+                    break
+                if on_stack[neighbour] and index[neighbour] < lowlink[node]:
+                    lowlink[node] = index[neighbour]
+            else:
+                # 全ての隣接ノードを処理し終えたのでバックトラック
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = component_stack.pop()
+                        on_stack[member] = 0
+                        comp_id[member] = n_components
+                        if member == node:
+                            break
+                    n_components += 1
+
+    return comp_id
+
+
 class ProjectAnalyzer:
     """Pythonプロジェクトの静的解析を行い、構造情報を抽出するクラス。"""
 
     def __init__(self, project_root: str):
         self.project_root = os.path.abspath(project_root)
         self.file_map: Dict[str, Dict[str, Any]] = defaultdict(dict)
-        # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
-        self.all_defined_symbols: Set[str] = set(dir(builtins)) | {'__file__', '__name__'}
-        # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
+        self.builtin_symbols = BUILTIN_SYMBOLS
+        # プロジェクト内で定義されているシンボル
+        self.all_defined_symbols: Set[str] = set()
+        self.cache_path = os.path.join(self.project_root, CACHE_FILE_NAME)
+        # ドット区切りのモジュール名から、プロジェクトルートからの相対パスへの索引
+        self._module_index: Dict[str, str] = {}
+        self._cache: Dict[str, Dict[str, Any]] = {}
 
     def analyze(self) -> Dict[str, Any]:
         """プロジェクト内の全Pythonファイルを解析し、結果を集計する。"""
-        py_files = self._get_python_files()
-        for file_path in py_files:
-            self._analyze_file(file_path)
-        
+        py_files, rel_paths = self._get_python_files()
+        self._load_cache(rel_paths)
+
+        # 前回の実行から (mtime, サイズ) が変わっていないファイルはキャッシュを再利用する
+        records: Dict[str, Dict[str, Any]] = {}
+        new_cache: Dict[str, Dict[str, Any]] = {}
+        pending: List[Tuple[str, str]] = []
+        rekeyed = False
+        for file_path, rel_path in zip(py_files, rel_paths):
+            try:
+                st = os.stat(file_path)
+            except OSError as e:
+                # リンク切れのシンボリックリンクや、走査後に削除されたファイルは読み飛ばす
+                print(f"Skipping file due to error: {file_path} - {e}")
+                continue
+            key = [st.st_mtime_ns, st.st_size]
+            entry = self._cache.get(rel_path)
+            if entry and entry["key"] == key:
+                records[rel_path] = entry["record"]
+                new_cache[rel_path] = entry
+            elif entry and entry["hash"] == _file_digest(file_path):
+                # git checkoutなどでmtimeだけが変わったファイルは、内容が同じなら構文解析しない
+                records[rel_path] = entry["record"]
+                new_cache[rel_path] = {"key": key, "hash": entry["hash"], "record": entry["record"]}
+                rekeyed = True
+            else:
+                pending.append((file_path, rel_path))
+                new_cache[rel_path] = {"key": key}
+
+        for result in self._analyze_files(pending):
+            if result:
+                rel_path, data, digest = result
+                records[rel_path] = _intern_record(data)
+                new_cache[rel_path]["hash"] = digest
+                new_cache[rel_path]["record"] = data
+
+        for rel_path in rel_paths:
+            if rel_path in records:
+                self.file_map[rel_path] = records[rel_path]
+
+        # 解析に失敗したファイルは次回も再解析する
+        new_cache = {k: v for k, v in new_cache.items() if "record" in v}
+        if pending or rekeyed or new_cache.keys() != self._cache.keys():
+            self._save_cache(rel_paths, new_cache)
+
         self._collect_all_defined_symbols()
         return self._build_final_report()
 
-    def _get_python_files(self) -> List[str]:
-        py_files = []
-        for root, _, files in os.walk(self.project_root):
-            # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
-            # .venvのようなディレクトリを除外
-            if any(d in root for d in ['.venv', '.git', '__pycache__', 'node_modules', '.mypy_cache']):
+    def _analyze_files(self, files: List[Tuple[str, str]]) -> Iterator[Optional[Tuple[str, Dict[str, Any], str]]]:
+        """(絶対パス, 相対パス) の組ごとにファイルを解析し、`analyze_one` の結果を入力と同じ順序で返す。"""
+        if len(files) < _PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+            # 少数のファイルではワーカープロセスの起動コストの方が大きい
+            for file_path, rel_path in files:
+                yield analyze_one(file_path, rel_path, self._module_index)
+            return
+        # 構文解析とAST走査はファイルごとに独立したCPU処理なのでプロセスに分散する
+        file_paths, rel_paths = zip(*files)
+        with ProcessPoolExecutor(initializer=_init_worker, initargs=(self._module_index,)) as executor:
+            yield from executor.map(analyze_one, file_paths, rel_paths, chunksize=16)
+
+    def _files_signature(self, rel_paths: List[str]) -> str:
+        # インポートの解決結果はプロジェクト内のファイル構成に依存するため、
+        # ファイルの追加・削除があればキャッシュ全体を無効にする
+        return hashlib.sha1("\n".join(sorted(rel_paths)).encode("utf-8")).hexdigest()
+
+    def _load_cache(self, rel_paths: List[str]):
+        """前回の解析結果のキャッシュを読み込む。"""
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = f.read()
+            # json.loadsもUTF-8のバイト列をそのまま受け取れる
+            cache = orjson.loads(data) if orjson is not None else json.loads(data)
+        except (OSError, ValueError):
+            return
+        # 手作業での編集や別のツールが書いたファイルなど、形式の合わないキャッシュは
+        # 解析を止めずに無視し、全ファイルを解析し直す
+        try:
+            if cache.get("version") != _CACHE_VERSION or cache.get("files") != self._files_signature(rel_paths):
+                return
+            entries: Dict[str, Dict[str, Any]] = {}
+            for rel_path, entry in cache["entries"].items():
+                if not isinstance(entry["key"], list) or not isinstance(entry["hash"], str):
+                    return
+                record = entry["record"]
+                record["used_lines"] = array('i', record["used_lines"])
+                record["imports"] = set(record["imports"])
+                if not all("type" in d and "line" in d for d in record["definitions"]):
+                    return
+                _intern_record(record)
+                entries[rel_path] = entry
+        except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+            return
+        self._cache = entries
+
+    def _save_cache(self, rel_paths: List[str], entries: Dict[str, Dict[str, Any]]):
+        """解析結果をキャッシュファイルに保存する。"""
+        cache = {
+            "version": _CACHE_VERSION,
+            "files": self._files_signature(rel_paths),
+            "entries": entries,
+        }
+        try:
+            if orjson is not None:
+                data = orjson.dumps(cache, default=_json_default)
+                with open(self.cache_path, "wb") as f:
+                    f.write(data)
+            else:
+                with open(self.cache_path, "w", encoding="utf-8") as f:
+                    json.dump(cache, f, ensure_ascii=False, default=_json_default)
+        except OSError as e:
+            print(f"Could not write analysis cache to {self.cache_path}: {e}")
+
+    def _get_python_files(self) -> Tuple[List[str], List[str]]:
+        """.pyファイルの絶対パスと相対パスを列挙し、同時にドット区切りのモジュール名から相対パスへの索引を作る。
+
+        相対パスはここで一度だけ求め、以降の処理はファイルごとに使い回す。
+        """
+        py_files = list(self._iter_py_files(self.project_root))
+        # scandirが返すパスはプロジェクトルートで始まるので、接頭辞を切り落とすだけで相対パスになる
+        prefix_len = len(os.path.join(self.project_root, ''))
+        rel_paths = [file_path[prefix_len:] for file_path in py_files]
+        self._module_index = {}
+        for rel_path in rel_paths:
+            parts = rel_path[:-3].split(os.sep)
+            if any('.' in part for part in parts):
+                # ドットを含む名前はインポートできない
                 continue
-            # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
-            for file in files:
-                if file.endswith(".py"):
-                    py_files.append(os.path.join(root, file))
-        return py_files
-
-    def _analyze_file(self, file_path: str):
-        """単一のファイルを解析し、情報を`self.file_map`に格納する。"""
+            if parts[-1] == '__init__':
+                # パッケージ名 'pkg' は pkg.py が優先され、無ければ pkg/__init__.py
+                self._module_index.setdefault('.'.join(parts[:-1]), rel_path)
+            else:
+                self._module_index['.'.join(parts)] = rel_path
+        return py_files, rel_paths
+
+    def _iter_py_files(self, root: str) -> Iterator[str]:
+        """os.scandirで再帰的に走査し、除外ディレクトリには降りずに.pyファイルを列挙する。"""
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            tree = ast.parse(content, filename=file_path)
-            
-            visitor = SymbolVisitor(file_path, self.project_root)
-            visitor.visit(tree)
-
-            rel_path = os.path.relpath(file_path, self.project_root)
-            self.file_map[rel_path] = {
-                "definitions": visitor.definitions,
-                "used_symbols": visitor.used_symbols,
-                "imports": {os.path.relpath(p, self.project_root) for p in visitor.imports if p},
-            }
-        except Exception as e:
-            print(f"Skipping file due to error: {file_path} - {e}")
-    
+            entries = list(os.scandir(root))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                # .venvのようなディレクトリは配下を走査する前に除外
+                if entry.name not in EXCLUDED_DIRS:
+                    yield from self._iter_py_files(entry.path)
+            elif entry.name.endswith(".py"):
+                yield entry.path
+
     def _collect_all_defined_symbols(self):
         """プロジェクト全体で定義されているシンボルを収集する。"""
-        for data in self.file_map.values():
-            for definition in data["definitions"]:
-                self.all_defined_symbols.add(definition["name"])
+        # 全ファイルの定義名を一度のupdateでまとめて追加する
+        self.all_defined_symbols.update(
+            definition["name"] for data in self.file_map.values() for definition in data["definitions"]
+        )
 
     def _build_final_report(self) -> Dict[str, Any]:
         """解析結果を集計し、最終的なレポートを作成する。"""
         undefined = self._find_undefined_symbols()
         unused = self._find_unused_symbols()
-        circular = self._detect_circular_imports()
-        coupling = self._calculate_coupling()
+        id_to_path, indptr, indices = self._build_import_graph()
+        circular = self._detect_circular_imports(id_to_path, indptr, indices)
+        coupling = self._calculate_coupling(id_to_path, indices)
 
         # file_mapにカップリング情報を追加
         for file, metrics in coupling.items():
             if file in self.file_map:
                 self.file_map[file]['coupling'] = metrics
 
+        # 内部では参照名と行番号を別々の配列で持つが、レポートは従来どおり [名前, 行] の組で出力する
+        file_details: Dict[str, Dict[str, Any]] = {}
+        for file, data in self.file_map.items():
+            details = {
+                "definitions": data["definitions"],
+                "used_symbols": list(zip(data["used_names"], data["used_lines"])),
+                "imports": data["imports"],
+            }
+            if "coupling" in data:
+                details["coupling"] = data["coupling"]
+            file_details[file] = details
+
         return {
             "project_root": self.project_root,
             "issues": {
@@ -265,32 +621,32 @@ class ProjectAnalyzer:
                 "unused_symbols": sorted(unused, key=lambda x: (x['file'], x['line'])),
                 "circular_imports": circular,
             },
-            "file_details": self.file_map
+            "file_details": file_details
         }
 
     def _find_undefined_symbols(self) -> List[Dict[str, Any]]:
         """未定義シンボルを検出する。"""
-        undefined_symbols = []
+        # (シンボル, ファイル, 行) のタプルで集めることで重複を蓄積時に取り除く
+        seen: Set[Tuple[str, str, int]] = set()
         for file, data in self.file_map.items():
-            for symbol, line_no in data["used_symbols"]:
-                # プロジェクト全体でも定義されていないシンボルを検出
-                if symbol not in self.all_defined_symbols:
-                    undefined_symbols.append({
-                        "symbol": symbol,
-                        "file": file,
-                        "line": line_no,
-                    })
-        # 重複削除
-        return [dict(t) for t in {tuple(d.items()) for d in undefined_symbols}]
+            used_names = data["used_names"]
+            # 組み込みにもプロジェクト全体にも定義の無い名前を集合の差でまとめて求める
+            missing = set(used_names)
+            missing -= self.builtin_symbols
+            missing -= self.all_defined_symbols
+            if not missing:
+                # 大半のファイルは未定義シンボルを含まないので、参照ごとの確認を省く
+                continue
+            for symbol, line_no in zip(used_names, data["used_lines"]):
+                if symbol in missing:
+                    seen.add((symbol, file, line_no))
+        return [{"symbol": s, "file": f, "line": l} for s, f, l in seen]
 
     def _find_unused_symbols(self) -> List[Dict[str, Any]]:
         """未使用のグローバル関数・クラスを検出する。"""
-        all_used_symbols = set()
-        for data in self.file_map.values():
-            for symbol, _ in data["used_symbols"]:
-                all_used_symbols.add(symbol)
-        
-        unused_symbols = []
+        all_used_symbols = set(chain.from_iterable(data["used_names"] for data in self.file_map.values()))
+
+        unused: List[Tuple[str, str, str, int]] = []
         for file, data in self.file_map.items():
             for definition in data["definitions"]:
                 # インポートされたシンボルは対象外とし、関数とクラスに絞る
@@ -298,113 +654,116 @@ class ProjectAnalyzer:
                     if definition['name'] not in all_used_symbols:
                         # __init__など特殊メソッドは無視
                         if not definition['name'].startswith('__'):
-                            unused_symbols.append({
-                                "symbol": definition['name'],
-                                "type": definition['type'],
-                                "file": file,
-                                "line": definition['line'],
-                            })
-        return unused_symbols
-
-    def _detect_circular_imports(self) -> List[List[str]]:
-        """循環参照を検出する。"""
-        graph = {file: data["imports"] for file, data in self.file_map.items()}
+                            unused.append((definition['name'], definition['type'], file, definition['line']))
+        return [{"symbol": s, "type": t, "file": f, "line": l} for s, t, f, l in unused]
+
+    def _build_import_graph(self) -> Tuple[List[str], array, array]:
+        """ファイルパスを整数IDに変換し、インポートグラフをCSR形式で構築する。
+
+        ノード v の依存先は indices[indptr[v]:indptr[v + 1]] に格納される。
+        """
+        id_to_path = list(self.file_map.keys())
+        path_to_id = {path: i for i, path in enumerate(id_to_path)}
+        indptr = array('i', [0])
+        indices = array('i')
+        for path in id_to_path:
+            # 解析対象外のファイルへのエッジは循環にも求心性結合にも寄与しない
+            indices.extend(path_to_id[p] for p in self.file_map[path]["imports"] if p in path_to_id)
+            indptr.append(len(indices))
+        return id_to_path, indptr, indices
+
+    def _detect_circular_imports(self, id_to_path: List[str], indptr: array, indices: array) -> List[List[str]]:
+        """循環参照を検出する。
+
+        強連結成分のうちサイズ2以上のもの、または自己ループを持つものを循環として報告する。
+        """
+        comp_id = _tarjan_scc(indptr, indices)
+        components: Dict[int, List[int]] = defaultdict(list)
+        for node, comp in enumerate(comp_id):
+            components[comp].append(node)
+
         cycles = []
-        
-        path: List[str] = []
-        visiting: Set[str] = set()
-        visited: Set[str] = set()
-
-        def dfs(node: str):
-            visiting.add(node)
-            path.append(node)
-
-            for neighbour in graph.get(node, []):
-                if neighbour in visiting:
-                    try:
-                        cycle_start_index = path.index(neighbour)
-                        cycle = path[cycle_start_index:] + [neighbour]
-                        sorted_cycle = tuple(sorted(cycle))
-                        if sorted_cycle not in {tuple(sorted(c)) for c in cycles}:
-                             cycles.append(cycle)
-                    except ValueError:
-                        continue # Should not happen
-                elif neighbour not in visited:
-                    dfs(neighbour)
-            
-            path.pop()
-            visiting.remove(node)
-            visited.add(node)
-
-        for node in graph:
-            if node not in visited:
-                dfs(node)
-                    
-        return cycles
-
-    def _calculate_coupling(self) -> Dict[str, Dict[str, int]]:
-        """ファイルの結合度（Afferent/Efferent）を計算する。"""
-        coupling = defaultdict(lambda: {"afferent": 0, "efferent": 0})
-        
-        # Efferent Coupling (Ca: 遠心性結合) - このファイルが依存している数
-        for file, data in self.file_map.items():
-            coupling[file]["efferent"] = len(data.get("imports", []))
+        for members in components.values():
+            node = members[0]
+            if len(members) > 1 or node in indices[indptr[node]:indptr[node + 1]]:
+                cycles.append(sorted(id_to_path[m] for m in members))
+        return sorted(cycles)
 
-        # Afferent Coupling (Ce: 求心性結合) - このファイルに依存している数
-        for _, data in self.file_map.items():
-            for imported_file in data.get("imports", []):
-                if imported_file in self.file_map:
-                    coupling[imported_file]["afferent"] += 1
-                    
-        return dict(coupling)
+    def _calculate_coupling(self, id_to_path: List[str], indices: array) -> Dict[str, Dict[str, int]]:
+        """ファイルの結合度（Afferent/Efferent）を計算する。"""
+        # Afferent Coupling (Ca: 求心性結合) - このファイルに依存している数
+        # 全エッジの依存先IDを一度だけ走査して数え上げる
+        ca = array('i', [0]) * len(id_to_path)
+        for j in indices:
+            ca[j] += 1
+
+        # Efferent Coupling (Ce: 遠心性結合) - このファイルが依存している数
+        # 解析対象外のファイルへの依存も数えるため、インポート集合の大きさを使う
+        return {
+            path: {"afferent": ca[i], "efferent": len(self.file_map[path]["imports"])}
+            for i, path in enumerate(id_to_path)
+        }
 
 
 def print_analysis_results(results: Dict[str, Any]):
     """解析結果をコンソールに分かりやすく出力する。"""
-    print("\n--- Project Analysis Results ---")
+    # 行ごとにprintせず、全体を組み立ててから一度だけ書き出す
+    lines = ["\n--- Project Analysis Results ---"]
     
     issues = results.get("issues", {})
     
     if issues.get("undefined_symbols"):
-        print(f"\n[❌] Found {len(issues['undefined_symbols'])} Undefined Symbols:")
-        for item in issues["undefined_symbols"]:
-            print(f"  - {item['file']}:{item['line']} -> '{item['symbol']}' is not defined")
+        lines.append(f"\n[❌] Found {len(issues['undefined_symbols'])} Undefined Symbols:")
+        lines.extend(
+            f"  - {item['file']}:{item['line']} -> '{item['symbol']}' is not defined"
+            for item in issues["undefined_symbols"]
+        )
     else:
-        print("\n[✅] No undefined symbols found.")
+        lines.append("\n[✅] No undefined symbols found.")
 
     if issues.get("unused_symbols"):
-        print(f"\n[⚠️] Found {len(issues['unused_symbols'])} Unused Global Symbols:")
-        for item in issues["unused_symbols"]:
-            print(f"  - {item['file']}:{item['line']} -> {item['type']} '{item['symbol']}' seems to be unused.")
+        lines.append(f"\n[⚠️] Found {len(issues['unused_symbols'])} Unused Global Symbols:")
+        lines.extend(
+            f"  - {item['file']}:{item['line']} -> {item['type']} '{item['symbol']}' seems to be unused."
+            for item in issues["unused_symbols"]
+        )
     else:
-        print("\n[✅] No unused global symbols found.")
+        lines.append("\n[✅] No unused global symbols found.")
 
     if issues.get("circular_imports"):
-        print(f"\n[⛔️] Found {len(issues['circular_imports'])} Circular Imports:")
-        for i, cycle in enumerate(issues["circular_imports"]):
-            print(f"  - Cycle {i+1}: {' -> '.join(cycle)}")
+        lines.append(f"\n[⛔️] Found {len(issues['circular_imports'])} Circular Imports:")
+        lines.extend(
+            f"  - Cycle {i+1}: {' <-> '.join(cycle)}"
+            for i, cycle in enumerate(issues["circular_imports"])
+        )
     else:
-        print("\n[✅] No circular imports found.")
+        lines.append("\n[✅] No circular imports found.")
+
+    lines.append("\n--- Analysis Complete ---")
+    sys.stdout.write("\n".join(lines) + "\n")
 
-    print("\n--- Analysis Complete ---")
+
+def _json_default(obj: Any) -> Any:
+    """json.dumpが直接扱えない値を変換する。setはソート済みのリスト、arrayはリストとして出力する。"""
+    if isinstance(obj, set):
+        return sorted(obj)
+    if isinstance(obj, array):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 
 def save_results_to_json(results: Dict[str, Any], output_file: str):
     """解析結果をJSONファイルに保存する。"""
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            # setをリストに変換してシリアライズ可能にする
-            def convert_sets_to_lists(obj):
-                if isinstance(obj, set):
-                    return sorted(list(obj))
-                if isinstance(obj, dict):
-                    return {k: convert_sets_to_lists(v) for k, v in obj.items()}
-                if isinstance(obj, list):
-                    return [convert_sets_to_lists(i) for i in obj]
-                return obj
-            
-            serializable_results = convert_sets_to_lists(results)
-            json.dump(serializable_results, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            # C実装のorjsonはUTF-8のバイト列を直接生成するため、json.dumpより大幅に速い
+            data = orjson.dumps(results, default=_json_default, option=orjson.OPT_INDENT_2)
+            with open(output_file, 'wb') as f:
+                f.write(data)
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                # setはシリアライズ中にその場で変換し、結果全体のコピーは作らない
+                json.dump(results, f, indent=2, ensure_ascii=False, default=_json_default)
         print(f"\nFull analysis results saved to {output_file}")
     except (IOError, TypeError) as e:
         print(f"\nError saving results to {output_file}: {e}")
@@ -7,8 +7,16 @@
 import os
 import ast
 import argparse
+import string
 from collections import defaultdict
-from typing import List, Dict, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, List, Dict, Optional, Set, Iterator
+
+# 文を子に持ち得るノード型。import文は式の中には現れないので、式の部分木には降りない
+_STATEMENT_TYPES = tuple(getattr(ast, name) for name in ('stmt', 'excepthandler', 'match_case') if hasattr(ast, name))
+# これより少ないファイル数ではプロセスプールを使わずに解析します
+_PARALLEL_MIN_FILES = 32
 
 class ModuleVisitor(ast.NodeVisitor):
     """
@@ -31,11 +39,16 @@ class ModuleVisitor(ast.NodeVisitor):
         module_path, _ = os.path.splitext(relative_path)
         return module_path.split(os.path.sep)
 
+    def generic_visit(self, node: ast.AST):
+        """文とその本体だけを辿り、import文を含み得ない式の部分木は訪問しません。"""
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _STATEMENT_TYPES):
+                self.visit(child)
+
     def visit_Import(self, node: ast.Import):
         """ 'import a.b.c' 形式のインポートを処理します。 """
         for alias in node.names:
             self.imports.add(alias.name)
-        self.generic_visit(node)
 
     def visit_ImportFrom(self, node: ast.ImportFrom):
         """ 'from . import ...' や 'from package import ...' 形式のインポートを処理します。 """
@@ -55,8 +68,33 @@ class ModuleVisitor(ast.NodeVisitor):
         
         elif node.module:  # from package import module などの絶対インポート
             self.imports.add(node.module)
-            
-        self.generic_visit(node)
+
+def collect_imports(file_path: str, project_root: str) -> Set[str]:
+    """
+    ファイルを構文解析し、インポートされているモジュール名の集合を返します。
+    ワーカープロセスから呼び出せるようモジュールレベルに置いています。
+    解析できなかったファイルは警告を表示し、空の集合を返します。
+    """
+    try:
+        # バイト列のまま渡すと、デコードとPEP 263のエンコーディング宣言の処理は
+        # パーサー内部で一度だけ行われる
+        with open(file_path, "rb") as f:
+            source = f.read()
+        # 解析できないファイルを警告で知らせるため、構文解析はすべてのファイルで行う
+        tree = ast.parse(source, filename=file_path)
+        # import文にも from ... import 文にも必ず 'import' キーワードが現れるので、
+        # 含まないファイルは構文木を辿らずに済ませる
+        if b"import" not in source:
+            return set()
+
+        visitor = ModuleVisitor(project_root, file_path)
+        visitor.visit(tree)
+        return visitor.imports
+    except SyntaxError as e:
+        print(f"警告: 構文エラーのため {file_path} を解析できませんでした: {e}")
+    except Exception as e:
+        print(f"警告: {file_path} の処理中にエラーが発生しました: {e}")
+    return set()
 
 class DependencyAnalyzer:
     """
@@ -67,14 +105,22 @@ class DependencyAnalyzer:
         # 除外ディレクトリの絶対パスリストを作成
         excluded = exclude_dirs or []
         self.exclude_dirs = [os.path.abspath(os.path.join(self.project_root, d)) for d in excluded]
+        # 除外ディレクトリの末尾に区切り文字を付けた接頭辞。配下の判定を文字列の前方一致だけで行う
+        self._excluded_prefixes = tuple(os.path.join(d, '') for d in self.exclude_dirs)
+        # 走査で得られるパスはすべてこの接頭辞で始まる
+        self._root_prefix = os.path.join(self.project_root, '')
         self.dependencies: Dict[str, Set[str]] = defaultdict(set)
         self.all_project_modules: Set[str] = set()
 
     def _path_to_module(self, path: str) -> str:
         """ファイルパスを完全なモジュール名に変換します (例: /path/to/app/main.py -> app.main)。"""
-        relative_path = os.path.relpath(path, self.project_root)
-        if relative_path.startswith('..'):
-            return ""
+        if path.startswith(self._root_prefix):
+            # 接頭辞を切り落とすだけで相対パスになる
+            relative_path = path[len(self._root_prefix):]
+        else:
+            relative_path = os.path.relpath(path, self.project_root)
+            if relative_path.startswith('..'):
+                return ""
         
         module_path, _ = os.path.splitext(relative_path)
         
@@ -84,89 +130,160 @@ class DependencyAnalyzer:
 
         return module_path.replace(os.path.sep, '.')
 
-    def _is_excluded(self, path: str) -> bool:
-        """指定されたパスが除外対象のディレクトリまたは一般的な除外パターンに一致するか判定します。"""
-        # --excludeで指定されたディレクトリを除外
-        abs_path = os.path.abspath(path)
-        for excluded_dir in self.exclude_dirs:
-            if os.path.commonpath([abs_path, excluded_dir]) == excluded_dir:
-                return True
-        # 一般的な仮想環境やキャッシュディレクトリを除外
-        parts = abs_path.split(os.sep)
-        if any(part.startswith('.') or part == '__pycache__' or part == 'venv' for part in parts):
+    def _is_excluded_entry(self, entry: os.DirEntry) -> bool:
+        """
+        走査中に見つかったディレクトリが、--excludeで指定されたディレクトリ(とその配下)か、
+        一般的な仮想環境・キャッシュディレクトリであれば除外対象と判定します。
+        親ディレクトリは判定済みなので、パスの分割や正規化をせずにこのディレクトリ自身だけを調べます。
+        """
+        name = entry.name
+        if name.startswith('.') or name == '__pycache__' or name == 'venv':
             return True
-        return False
+        return os.path.join(entry.path, '').startswith(self._excluded_prefixes)
 
     def analyze(self):
         """プロジェクト全体の依存関係を解析します。"""
-        # ステップ1: プロジェクト内に存在するすべてのモジュールをリストアップ
-        for root, dirs, files in os.walk(self.project_root, topdown=True):
-            # 除外ディレクトリ配下は探索しない
-            dirs[:] = [d for d in dirs if not self._is_excluded(os.path.join(root, d))]
-            
-            for file in files:
-                if file.endswith(".py"):
-                    path = os.path.join(root, file)
-                    module_name = self._path_to_module(path)
-                    if module_name:
-                        self.all_project_modules.add(module_name)
-        
+        # ステップ1: 一度の走査で解析対象のファイルとプロジェクト内のすべてのモジュールをリストアップ
+        file_paths: List[str] = []
+        importer_modules: List[str] = []
+        for file_path in self._iter_py_files(self.project_root):
+            importer_module = self._path_to_module(file_path)
+
+            if importer_module:
+                file_paths.append(file_path)
+                importer_modules.append(importer_module)
+        self.all_project_modules.update(importer_modules)
+
         # ステップ2: 各ファイルを解析し、依存関係を構築
-        for root, dirs, files in os.walk(self.project_root, topdown=True):
-            dirs[:] = [d for d in dirs if not self._is_excluded(os.path.join(root, d))]
-            
-            for file in files:
-                if file.endswith(".py"):
-                    file_path = os.path.join(root, file)
-                    importer_module = self._path_to_module(file_path)
-
-                    if not importer_module:
-                        continue
-
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                            tree = ast.parse(content, filename=file_path)
-                        
-                        visitor = ModuleVisitor(self.project_root, file_path)
-                        visitor.visit(tree)
-
-                        for imported in visitor.imports:
-                            # インポートされたモジュールがプロジェクト内部のものか判定
-                            parts = imported.split('.')
-                            # 'a.b.c' のようにインポートされた場合、'a.b.c', 'a.b', 'a' の順で
-                            # プロジェクトモジュールに存在するかチェックする
-                            for i in range(len(parts), 0, -1):
-                                sub_module = ".".join(parts[:i])
-                                if sub_module in self.all_project_modules:
-                                    if importer_module != sub_module:  # 自己参照は追加しない
-                                        self.dependencies[importer_module].add(sub_module)
-                                    # 最も長く一致するモジュール（最も具体的）を依存先としたら終了
-                                    break
-                    except SyntaxError as e:
-                        print(f"警告: 構文エラーのため {file_path} を解析できませんでした: {e}")
-                    except Exception as e:
-                        print(f"警告: {file_path} の処理中にエラーが発生しました: {e}")
-
-    def find_circular_dependencies(self) -> Set[Tuple[str, str]]:
-        """循環参照しているモジュールのペアを検出します。"""
-        circular_pairs = set()
-        # AがBをインポートし、かつBがAをインポートしているペアを探す
-        for importer, imported_set in self.dependencies.items():
-            for imported in imported_set:
-                if importer in self.dependencies.get(imported, set()):
-                    # アルファベット順にソートしてタプルに格納し、重複を防ぐ (A,B) と (B,A) を統一
-                    pair = tuple(sorted((importer, imported)))
-                    circular_pairs.add(pair)
-        return circular_pairs
+        module_trie = self._build_module_trie()
+        for importer_module, imports in zip(importer_modules, self._collect_all_imports(file_paths)):
+            for imported in imports:
+                # インポートされたモジュールがプロジェクト内部のものか判定
+                # 'a.b.c' のようにインポートされた場合、'a', 'a.b', 'a.b.c' の順にトライ木を辿り、
+                # 最も長く一致するモジュール（最も具体的）を依存先とする
+                node = module_trie
+                sub_module = None
+                for part in imported.split('.'):
+                    node = node.get(part)
+                    if node is None:
+                        break
+                    sub_module = node.get(None, sub_module)
+                if sub_module and importer_module != sub_module:  # 自己参照は追加しない
+                    self.dependencies[importer_module].add(sub_module)
+
+    def _build_module_trie(self) -> Dict[Optional[str], Any]:
+        """
+        プロジェクト内のモジュール名をドット区切りのパーツごとに辿れるトライ木を作ります。
+        モジュール名が終わるノードには、キー None にそのモジュール名を持たせます。
+        """
+        trie: Dict[Optional[str], Any] = {}
+        for module in self.all_project_modules:
+            node = trie
+            for part in module.split('.'):
+                node = node.setdefault(part, {})
+            node[None] = module
+        return trie
+
+    def _iter_py_files(self, root: str) -> Iterator[str]:
+        """
+        os.scandirで再帰的に走査し、.pyファイルのパスを os.walk と同じ順序で列挙します。
+        除外ディレクトリとシンボリックリンクのディレクトリ配下は探索しません。
+        """
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            return
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink() and not self._is_excluded_entry(entry):
+                    subdirs.append(entry.path)
+            elif entry.name.endswith(".py"):
+                yield entry.path
+        for subdir in subdirs:
+            yield from self._iter_py_files(subdir)
+
+    def _collect_all_imports(self, file_paths: List[str]) -> Iterator[Set[str]]:
+        """各ファイルのインポートを `collect_imports` で収集し、入力と同じ順序で返します。"""
+        if len(file_paths) < _PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+            # 少数のファイルではワーカープロセスの起動コストの方が大きい
+            for file_path in file_paths:
+                yield collect_imports(file_path, self.project_root)
+            return
+        # 構文解析はファイルごとに独立したCPU処理なのでプロセスに分散する
+        with ProcessPoolExecutor() as executor:
+            yield from executor.map(collect_imports, file_paths, repeat(self.project_root), chunksize=16)
+
+    def find_circular_dependencies(self) -> List[List[str]]:
+        """
+        循環参照しているモジュールのグループを検出します。
+        強連結成分のうち2つ以上のモジュールを含むもの（または自己参照を持つもの）を、
+        モジュール名でソートしたリストとして返します。3つ以上のモジュールにまたがる循環も検出します。
+        """
+        cycles = []
+        for component in _strongly_connected_components(self.dependencies):
+            node = component[0]
+            if len(component) > 1 or node in self.dependencies.get(node, ()):
+                cycles.append(sorted(component))
+        return sorted(cycles)
+
+def _strongly_connected_components(graph: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    Tarjanのアルゴリズムでグラフの強連結成分を求めます。O(V+E)で動作します。
+    再帰の代わりに (ノード, 隣接ノードのイテレータ) の明示的なスタックを使うため、
+    依存関係が深くても RecursionError になりません。
+    """
+    index: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    component_stack: List[str] = []
+    components: List[List[str]] = []
+
+    for root in sorted(graph):
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        component_stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(sorted(graph.get(root, ()))))]
+
+        while work:
+            node, neighbours = work[-1]
+            for neighbour in neighbours:
+                if neighbour not in index:
+                    index[neighbour] = lowlink[neighbour] = len(index)
+                    component_stack.append(neighbour)
+                    on_stack.add(neighbour)
+                    work.append((neighbour, iter(sorted(graph.get(neighbour, ())))))
+                    break
+                if neighbour in on_stack and index[neighbour] < lowlink[node]:
+                    lowlink[node] = index[neighbour]
+            else:
+                # 全ての隣接ノードを処理し終えたのでバックトラック
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
 
 class MermaidGenerator:
     """
     依存関係データからMermaidグラフ定義を生成するクラス。
     """
-    def __init__(self, dependencies: Dict[str, Set[str]], circular_pairs: Set[Tuple[str, str]]):
+    def __init__(self, dependencies: Dict[str, Set[str]], cycles: List[List[str]]):
         self.dependencies = dependencies
-        self.circular_pairs = circular_pairs
+        self.cycles = cycles
 
     def generate(self) -> str:
         """Mermaidのグラフ定義文字列を生成します。"""
@@ -174,17 +291,16 @@ class MermaidGenerator:
         
         styled_links = []
         normal_links = []
-        processed_links = set()
+        # 各モジュールが属する循環のID。同じ循環に属するモジュール間のリンクが循環参照の一部となる
+        cycle_ids = {module: i for i, cycle in enumerate(self.cycles) for module in cycle}
 
         # 全ての依存関係をアルファベット順で処理し、出力の順序を安定させる
-        for importer in sorted(self.dependencies.keys()):
-            for imported in sorted(list(self.dependencies[importer])):
-                link_tuple = (importer, imported)
-                if link_tuple in processed_links:
-                    continue
-                
+        # 依存先はモジュールごとの集合なので、同じリンクが二度現れることはない
+        for importer, imported_set in sorted(self.dependencies.items()):
+            cycle_id = cycle_ids.get(importer)
+            for imported in sorted(imported_set):
                 # このリンクが循環参照の一部かチェック
-                is_circular = tuple(sorted(link_tuple)) in self.circular_pairs
+                is_circular = cycle_id is not None and cycle_id == cycle_ids.get(imported)
                 
                 # Mermaidで特殊文字が含まれても大丈夫なようにモジュール名をクオートで囲む
                 link_str = f'    "{importer}" --> "{imported}";'
@@ -193,8 +309,6 @@ class MermaidGenerator:
                     styled_links.append(link_str)
                 else:
                     normal_links.append(link_str)
-                
-                processed_links.add(link_tuple)
 
         # Mermaid文字列を構築 (通常のリンク -> 循環リンクの順)
         lines.extend(normal_links)
@@ -208,72 +322,75 @@ class MermaidGenerator:
             
         return "\n".join(lines)
 
-class HTMLGenerator:
-    """
-    Mermaidグラフ定義を含むHTMLファイルを生成するクラス。
-    """
-    def __init__(self, mermaid_graph_definition: str, title: str = "Dependency Graph"):
-        self.mermaid_graph_definition = mermaid_graph_definition
-        self.title = title
-
-    def generate(self) -> str:
-        """Mermaidグラフを表示するためのHTML文字列を生成します。"""
-        html_content = f"""<!DOCTYPE html>
+# HTML出力のテンプレート。モジュール読み込み時に一度だけ構築し、$title と $graph を置換して使います。
+# CSSやJavaScriptの波括弧をエスケープする必要はありません。
+_HTML_TEMPLATE = string.Template("""<!DOCTYPE html>
 <html>
 <head>
-    <title>{self.title}</title>
+    <title>$title</title>
     <script type="module">
         import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.esm.min.mjs';
-        mermaid.initialize({{ startOnLoad: true }});
+        mermaid.initialize({ startOnLoad: true });
     </script>
     <style>
-        body {{
+        body {
             font-family: sans-serif;
             margin: 20px;
             background-color: #f4f4f4;
             color: #333;
-        }}
-        h1 {{
+        }
+        h1 {
             color: #0056b3;
-        }}
-        .mermaid {{
+        }
+        .mermaid {
             background-color: #fff;
             padding: 20px;
             border-radius: 8px;
             box-shadow: 0 4px 8px rgba(0,0,0,0.1);
             overflow: auto; /* グラフがはみ出す場合のためにスクロールバーを追加 */
-        }}
-        .container {{
+        }
+        .container {
             max-width: 1200px;
             margin: 0 auto;
-        }}
-        .info {{
+        }
+        .info {
             margin-top: 20px;
             padding: 15px;
             background-color: #e7f3ff;
             border-left: 6px solid #2196F3;
             margin-bottom: 20px;
-        }}
-        .info p {{
+        }
+        .info p {
             margin: 5px 0;
-        }}
+        }
     </style>
 </head>
 <body>
     <div class="container">
-        <h1>{self.title}</h1>
+        <h1>$title</h1>
         <div class="info">
             <p><strong>Note:</strong> Red dashed lines indicate circular dependencies.</p>
             <p>This graph visualizes the import relationships between modules in your Python project.</p>
         </div>
         <div class="mermaid">
-{self.mermaid_graph_definition}
+$graph
         </div>
     </div>
 </body>
 </html>
-"""
-        return html_content
+""")
+
+class HTMLGenerator:
+    """
+    Mermaidグラフ定義を含むHTMLファイルを生成するクラス。
+    """
+    def __init__(self, mermaid_graph_definition: str, title: str = "Dependency Graph"):
+        self.mermaid_graph_definition = mermaid_graph_definition
+        self.title = title
+
+    def generate(self) -> str:
+        """Mermaidグラフを表示するためのHTML文字列を生成します。"""
+        return _HTML_TEMPLATE.substitute(title=self.title, graph=self.mermaid_graph_definition)
 
 def main():
     """
@@ -348,8 +465,8 @@ def main():
         
     if circular_deps:
         print("🔥 循環参照が検出されました:")
-        for pair in sorted(list(circular_deps)):
-            print(f"  - {pair[0]} <--> {pair[1]}")
+        for cycle in circular_deps:
+            print(f"  - {' <--> '.join(cycle)}")
     else:
         print("✅ 循環参照は見つかりませんでした。")
 
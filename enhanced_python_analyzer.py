@@ -5,9 +5,37 @@
 import os
 import ast
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from collections import defaultdict
-from typing import Dict, List, Set, Optional, Union, Tuple, Any, cast
+from collections import defaultdict, deque
+from typing import Dict, List, Set, Optional, Union, Tuple, Any, Iterator, cast
+
+# Below this many files, extraction runs in-process instead of starting a process pool
+_PARALLEL_MIN_FILES = 32
+
+# Node types that can hold statements; imports and definitions never occur inside expressions
+_STATEMENT_TYPES = tuple(getattr(ast, name) for name in ('stmt', 'excepthandler', 'match_case') if hasattr(ast, name))
+
+def _iter_files(start_path: Union[str, Path], ignore_dirs: Set[str]) -> Iterator[os.DirEntry]:
+    """
+    Yield the file entries below start_path in os.walk order, skipping ignored and symlinked directories.
+    """
+    try:
+        entries = list(os.scandir(start_path))
+    except OSError:
+        return
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            yield entry
+        elif entry.name not in ignore_dirs and not entry.is_symlink():
+            subdirs.append(entry.path)
+    for subdir in subdirs:
+        yield from _iter_files(subdir, ignore_dirs)
 
 def get_project_tree(start_path: Union[str, Path], ignore_dirs: Set[str], indent: str = '') -> str:
     """
@@ -43,6 +71,16 @@ def get_project_tree(start_path: Union[str, Path], ignore_dirs: Set[str], indent
             tree_str += get_project_tree(item, ignore_dirs, next_indent)
     return tree_str
 
+def _walk_statements(tree: ast.AST) -> Iterator[ast.AST]:
+    """
+    Yield nodes in the same breadth-first order as ast.walk, without descending into expressions.
+    """
+    todo = deque([tree])
+    while todo:
+        node = todo.popleft()
+        todo.extend(child for child in ast.iter_child_nodes(node) if isinstance(child, _STATEMENT_TYPES))
+        yield node
+
 def extract_imports_and_functions(file_path: Path) -> Dict[str, Any]:
     """
     Extract imports, function definitions, and class definitions from a Python file.
@@ -57,69 +95,85 @@ def extract_imports_and_functions(file_path: Path) -> Dict[str, Any]:
     }
     
     try:
-        content = file_path.read_text(encoding='utf-8')
-        tree = ast.parse(content)
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    result['imports'].append(alias.name)
-            elif isinstance(node, ast.ImportFrom):
-                module = node.module or ''
-                for alias in node.names:
-                    result['from_imports'].append(f"{module}.{alias.name}")
-            elif isinstance(node, ast.FunctionDef):
-                result['functions'].append(node.name)
-            elif isinstance(node, ast.ClassDef):
-                result['classes'].append(node.name)
-            elif isinstance(node, ast.Assign):
-                for target in node.targets:
-                    if isinstance(target, ast.Name) and target.id.isupper():
-                        result['constants'].append(target.id)
-                        
-    except Exception as e:
+        # The parser decodes the bytes itself, honouring any PEP 263 coding declaration
+        tree = ast.parse(file_path.read_bytes())
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        # Only read/parse failures are reported; bugs in the analysis itself should surface.
+        # Deeply nested source makes the parser raise RecursionError or MemoryError.
         result['parse_error'] = str(e)
+        return result
+    
+    for node in _walk_statements(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                result['imports'].append(alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ''
+            for alias in node.names:
+                result['from_imports'].append(f"{module}.{alias.name}")
+        elif isinstance(node, ast.FunctionDef):
+            result['functions'].append(node.name)
+        elif isinstance(node, ast.ClassDef):
+            result['classes'].append(node.name)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    result['constants'].append(target.id)
     
     return result
 
-def analyze_module_dependencies(project_path: Path, ignore_dirs: Set[str]) -> Dict[str, List[str]]:
+def extract_all(py_files: List[Path]) -> Dict[Path, Dict[str, Any]]:
+    """
+    Run extract_imports_and_functions once per file, in a process pool for larger projects.
+    """
+    if len(py_files) < _PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+        return {file_path: extract_imports_and_functions(file_path) for file_path in py_files}
+    with ProcessPoolExecutor() as executor:
+        return dict(zip(py_files, executor.map(extract_imports_and_functions, py_files, chunksize=16)))
+
+def analyze_module_dependencies(project_path: Path, ignore_dirs: Set[str], analyses: Optional[Dict[Path, Dict[str, Any]]] = None, py_files: Optional[List[Path]] = None) -> Dict[str, List[str]]:
     """
     Analyze dependencies between modules within the project.
+    Pass analyses (as returned by extract_all) to reuse already extracted results.
+    Pass py_files to reuse an already collected list of the project's .py files.
     """
+    if py_files is None:
+        py_files = [Path(entry.path) for entry in _iter_files(project_path, ignore_dirs) if entry.name.endswith('.py')]
     dependencies: Dict[str, List[str]] = defaultdict(list)
-    all_modules: Set[str] = set()
+    module_names = [str(file_path.relative_to(project_path).with_suffix('')).replace(os.sep, '.') for file_path in py_files]
+    all_modules: Set[str] = set(module_names)
+    # Every string prefix of every module name, so "some module starts with x" is one set lookup
+    module_prefixes: Set[str] = {module[:i] for module in all_modules for i in range(len(module) + 1)}
     
-    for root, dirs, files in os.walk(project_path):
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-        for file in files:
-            if file.endswith('.py'):
-                file_path = Path(root) / file
-                relative_path = file_path.relative_to(project_path)
-                module_name = str(relative_path.with_suffix('')).replace(os.sep, '.')
-                all_modules.add(module_name)
-    
-    for root, dirs, files in os.walk(project_path):
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-        for file in files:
-            if file.endswith('.py'):
-                file_path = Path(root) / file
-                relative_path = file_path.relative_to(project_path)
-                current_module = str(relative_path.with_suffix('')).replace(os.sep, '.')
-                
-                analysis = extract_imports_and_functions(file_path)
-                imports_to_check: List[str] = (analysis.get('imports', []) or []) + (analysis.get('from_imports', []) or [])
-                for imp in imports_to_check:
-                    if isinstance(imp, str):
-                        for module in all_modules:
-                            if imp.startswith(module) or module.startswith(imp.split('.')[0]):
-                                dependencies[current_module].append(imp)
-                                break
+    if analyses is None:
+        analyses = extract_all(py_files)
+
+    for file_path, current_module in zip(py_files, module_names):
+        analysis = analyses[file_path]
+        imports_to_check: List[str] = (analysis.get('imports', []) or []) + (analysis.get('from_imports', []) or [])
+        for imp in imports_to_check:
+            if isinstance(imp, str):
+                # An import is internal if a module name starts with its first component,
+                # or if it starts with a module name
+                if imp.split('.', 1)[0] in module_prefixes or any(imp[:i] in all_modules for i in range(1, len(imp) + 1)):
+                    dependencies[current_module].append(imp)
     
     return dependencies
 
-def get_project_summary(project_path: Path, ignore_dirs: Set[str]) -> Dict[str, Any]:
+def _count_lines(data: bytes) -> int:
+    """
+    Count lines the way text-mode readlines() does: LF, CRLF and a lone CR each end a line,
+    and a trailing line without a terminator still counts.
+    """
+    lines = data.count(b'\n') + data.count(b'\r') - data.count(b'\r\n')
+    if data and not data.endswith((b'\n', b'\r')):
+        lines += 1
+    return lines
+
+def get_project_summary(project_path: Path, ignore_dirs: Set[str], files: Optional[List[os.DirEntry]] = None) -> Dict[str, Any]:
     """
     Generate a high-level summary of the project.
+    Pass files to reuse the entries of an earlier _iter_files walk.
     """
     summary: Dict[str, Any] = {
         'total_py_files': 0,
@@ -132,34 +186,36 @@ def get_project_summary(project_path: Path, ignore_dirs: Set[str]) -> Dict[str,
     
     file_sizes: List[Tuple[str, int]] = []
     
-    for root, dirs, files in os.walk(project_path):
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-        for file in files:
-            file_path = Path(root) / file
-            
-            if not file_path.exists():
-                continue
+    if files is None:
+        files = list(_iter_files(project_path, ignore_dirs))
+    for entry in files:
+        file = entry.name
+        file_path = Path(entry.path)
+        
+        try:
+            # DirEntry caches the stat result, so the size below needs no extra syscall
+            st = entry.stat()
+        except OSError:
+            continue
 
-            relative_path = file_path.relative_to(project_path)
+        relative_path = file_path.relative_to(project_path)
+        
+        if file.endswith('.py'):
+            summary['total_py_files'] += 1
+            size = st.st_size
+            file_sizes.append((str(relative_path), size))
             
-            if file.endswith('.py'):
-                summary['total_py_files'] += 1
-                size = file_path.stat().st_size
-                file_sizes.append((str(relative_path), size))
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = len(f.readlines())
-                        summary['total_lines'] += lines
-                except Exception:
-                    pass
-                
-                if 'test' in file.lower() or 'test' in str(relative_path).lower():
-                    summary['test_files'].append(str(relative_path))
-                elif file in ['main.py', 'app.py', '__main__.py', 'run.py']:
-                    summary['main_modules'].append(str(relative_path))
-            elif file.endswith(('.ini', '.cfg', '.conf', '.yaml', '.yml', '.json', '.toml')):
-                summary['config_files'].append(str(relative_path))
+            try:
+                summary['total_lines'] += _count_lines(file_path.read_bytes())
+            except OSError:
+                pass
+            
+            if 'test' in file.lower() or 'test' in str(relative_path).lower():
+                summary['test_files'].append(str(relative_path))
+            elif file in ['main.py', 'app.py', '__main__.py', 'run.py']:
+                summary['main_modules'].append(str(relative_path))
+        elif file.endswith(('.ini', '.cfg', '.conf', '.yaml', '.yml', '.json', '.toml')):
+            summary['config_files'].append(str(relative_path))
     
     file_sizes.sort(key=lambda x: x[1], reverse=True)
     summary['largest_files'] = file_sizes[:5]
@@ -180,11 +236,18 @@ def aggregate_enhanced_project_structure(project_path: str, output_file: str, ig
     
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(output_file, 'w', encoding='utf-8') as f:
+    # Walk the project once; every section below reuses these lists
+    files = list(_iter_files(project_path_obj, ignore_dirs))
+    py_files = sorted(Path(entry.path) for entry in files if entry.name.endswith('.py'))
+    # Extract each file once; sections 3 and 4 both read the results from here
+    analyses = extract_all(py_files) if include_analysis else {}
+
+    # A large buffer turns the many small section writes into few write syscalls
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
         f.write(f"# Project Analysis: {project_path_obj.name}\n\n")
         
         if include_analysis:
-            summary = get_project_summary(project_path_obj, ignore_dirs)
+            summary = get_project_summary(project_path_obj, ignore_dirs, files)
             f.write("## Project Summary\n\n")
             f.write(f"- **Total Python files**: {summary['total_py_files']}\n")
             f.write(f"- **Total lines of code**: {summary['total_lines']:,}\n")
@@ -220,45 +283,41 @@ def aggregate_enhanced_project_structure(project_path: str, output_file: str, ig
 
         if include_analysis:
             f.write("## 3. Internal Module Dependencies\n\n")
-            dependencies = analyze_module_dependencies(project_path_obj, ignore_dirs)
+            dependencies = analyze_module_dependencies(project_path_obj, ignore_dirs, analyses, py_files)
             if dependencies:
                 for module, deps in sorted(dependencies.items()):
                     if deps:
-                        f.write(f"### `{module}`\n")
-                        f.write("Dependencies:\n")
-                        for dep in sorted(list(set(deps))):
-                            f.write(f"- {dep}\n")
-                        f.write("\n")
+                        dep_lines = ''.join(f"- {dep}\n" for dep in sorted(set(deps)))
+                        f.write(f"### `{module}`\nDependencies:\n{dep_lines}\n")
             else:
                 f.write("No internal dependencies detected.\n\n")
 
         if include_analysis:
             f.write("## 4. File Analysis Overview\n\n")
-            py_files = sorted(project_path_obj.rglob('*.py'))
-            for file_path in py_files:
-                if not any(part in ignore_dirs for part in file_path.parts):
-                    relative_path = file_path.relative_to(project_path_obj)
-                    analysis = extract_imports_and_functions(file_path)
+            for file_path, analysis in analyses.items():
+                relative_path = file_path.relative_to(project_path_obj)
+                
+                # Assemble each file's entry and write it in one call
+                section = [f"### `{relative_path}`\n"]
+                if analysis.get('parse_error'):
+                    section.append(f"⚠️ Parse error: {analysis['parse_error']}\n\n")
+                    f.write(''.join(section))
+                    continue
                     
-                    f.write(f"### `{relative_path}`\n")
-                    if analysis.get('parse_error'):
-                        f.write(f"⚠️ Parse error: {analysis['parse_error']}\n\n")
-                        continue
-                        
-                    if analysis.get('classes'):
-                        f.write(f"**Classes**: {', '.join(analysis['classes'])}\n")
-                    if analysis.get('functions'):
-                        f.write(f"**Functions**: {', '.join(analysis['functions'])}\n")
-                    all_imports: List[str] = (analysis.get('imports', []) or []) + (analysis.get('from_imports', []) or [])
-                    external_imports = [imp for imp in all_imports if isinstance(imp, str) and not imp.startswith('.')]
-                    if external_imports:
-                        f.write(f"**External imports**: {', '.join(sorted(list(set(external_imports))))}\n")
-                    f.write("\n")
+                if analysis.get('classes'):
+                    section.append(f"**Classes**: {', '.join(analysis['classes'])}\n")
+                if analysis.get('functions'):
+                    section.append(f"**Functions**: {', '.join(analysis['functions'])}\n")
+                all_imports: List[str] = (analysis.get('imports', []) or []) + (analysis.get('from_imports', []) or [])
+                external_imports = [imp for imp in all_imports if isinstance(imp, str) and not imp.startswith('.')]
+                if external_imports:
+                    section.append(f"**External imports**: {', '.join(sorted(set(external_imports)))}\n")
+                section.append("\n")
+                f.write(''.join(section))
 
         f.write("## 5. Source Code\n\n")
-        py_files = sorted(project_path_obj.rglob('*.py'))
         for file_path in py_files:
-            if not any(part in ignore_dirs for part in file_path.parts) and file_path.name not in (ignore_files or set()):
+            if file_path.name not in (ignore_files or set()):
                 relative_path = file_path.relative_to(project_path_obj)
                 
                 f.write(f"### `{relative_path}`\n\n")
@@ -266,7 +325,7 @@ def aggregate_enhanced_project_structure(project_path: str, output_file: str, ig
                 try:
                     content = file_path.read_text(encoding='utf-8')
                     f.write(content)
-                except Exception as e:
+                except (OSError, UnicodeDecodeError) as e:
                     f.write(f"# Error reading file: {e}")
                 f.write("\n```\n\n")
 